@@ -1,10 +1,14 @@
 import gc
+import inspect
+import os
 import time
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 
 import numpy as np
 import torchvision.transforms as standard_transforms
 import yaml
+from torch.cuda.amp import autocast, GradScaler
 from torch.optim.lr_scheduler import CosineAnnealingWarmRestarts
 from torch.utils.data import DataLoader
 from tqdm import tqdm
@@ -20,22 +24,107 @@ from unet import *
 from resnet_leaky_relu import *
 from resnet_skip_residual import *
 
+# every batch has the same shape (voc.VOC resizes to 224x224), so let cudnn
+# autotune its conv algorithms once and allow TF32 on Ampere for fp32 paths
+torch.backends.cudnn.benchmark = True
+torch.backends.cuda.matmul.allow_tf32 = True
+torch.backends.cudnn.allow_tf32 = True
+
 
 class MaskToTensor(object):
     def __call__(self, img):
-        return torch.from_numpy(np.array(img, dtype=np.int32)).long()
-
-
-def init_weights(m):
-    if isinstance(m, nn.Conv2d) or isinstance(m, nn.ConvTranspose2d):
-        torch.nn.init.xavier_uniform_(m.weight.data)
-        torch.nn.init.normal_(m.bias.data)  # xavier not applicable for biases
-
-
-def init_weights_transfer_learning(m):
-    if isinstance(m, nn.ConvTranspose2d):
-        torch.nn.init.xavier_uniform_(m.weight.data)
-        torch.nn.init.normal_(m.bias.data)  # xavier not applicable for biases
+        # voc labels (0-20 and 255 for boundaries) fit in uint8, widen to long only once
+        return torch.from_numpy(np.array(img, dtype=np.uint8)).long()
+
+
+class NormalizeInput(nn.Module):
+    """
+    Normalizes uint8 image batches on the model's device, so the data loader
+    can ship raw uint8 images instead of float32 ones.
+    """
+
+    def __init__(self, mean, std):
+        super().__init__()
+        self.register_buffer('mean', torch.tensor(mean).view(1, 3, 1, 1) * 255)
+        self.register_buffer('std', torch.tensor(std).view(1, 3, 1, 1) * 255)
+
+    def forward(self, x):
+        return (x.float() - self.mean) / self.std
+
+
+class DataPrefetcher(object):
+    """
+    Wraps a DataLoader and copies the next batch to the device on a side cuda
+    stream while the current batch is being processed. next() returns
+    (None, None) once the loader is exhausted.
+    """
+
+    def __init__(self, loader, device):
+        self.loader = iter(loader)
+        self.device = device
+        self.stream = torch.cuda.Stream() if device.type == 'cuda' else None
+        self.preload()
+
+    def preload(self):
+        try:
+            self.next_input, self.next_target = next(self.loader)
+        except StopIteration:
+            self.next_input = None
+            self.next_target = None
+            return
+        if self.stream is None:
+            self.next_input = self.next_input.to(self.device, memory_format=torch.channels_last)
+            self.next_target = self.next_target.to(self.device)
+            return
+        with torch.cuda.stream(self.stream):
+            self.next_input = self.next_input.to(self.device, non_blocking=True, memory_format=torch.channels_last)
+            self.next_target = self.next_target.to(self.device, non_blocking=True)
+
+    def next(self):
+        if self.stream is not None:
+            torch.cuda.current_stream().wait_stream(self.stream)
+        input = self.next_input
+        target = self.next_target
+        if self.stream is not None and input is not None:
+            # the tensors were allocated on the side stream, tell the caching
+            # allocator they are now in use on the compute stream
+            input.record_stream(torch.cuda.current_stream())
+            target.record_stream(torch.cuda.current_stream())
+        self.preload()
+        return input, target
+
+
+def unwrap_model(model):
+    # torch.compile wraps the model, checkpoints should hold the original module's weights
+    return getattr(model, '_orig_mod', model)
+
+
+def _xavier_init(layers):
+    with torch.no_grad():
+        for m in layers:
+            torch.nn.init.xavier_uniform_(m.weight)
+            if m.bias is not None:
+                torch.nn.init.zeros_(m.bias)  # xavier not applicable for biases
+
+
+def init_weights(model):
+    _xavier_init([m for m in model.modules() if isinstance(m, (nn.Conv2d, nn.ConvTranspose2d))])
+
+
+def init_weights_transfer_learning(model):
+    # only the decoder is initialised, the pretrained encoder weights are kept
+    _xavier_init([m for m in model.modules() if isinstance(m, nn.ConvTranspose2d)])
+
+
+def load_class_weights(train_dataset, weights_path='Results/class_weights.npy'):
+    # the class histogram only depends on the training masks, so compute it
+    # once and reuse it across runs instead of rescanning every mask
+    if os.path.exists(weights_path):
+        return np.load(weights_path)
+    weights = train_dataset.get_class_weights().numpy()
+    os.makedirs(os.path.dirname(weights_path), exist_ok=True)
+    np.save(weights_path, weights)
+    return weights
 
 
 def load_constants(config_name):
@@ -48,6 +137,11 @@ def load_constants(config_name):
     model_type = config['model_type']
     model_identifier = config['model_identifier']
     freeze_encoder = config['freeze_encoder']
+    accum_steps = config.get('accum_steps', 1)
+    if isinstance(accum_steps, bool) or not isinstance(accum_steps, int) or accum_steps < 1:
+        raise ValueError(f'accum_steps must be a positive integer, got {accum_steps!r}')
+    compile_mode = config.get('compile_mode', 'max-autotune')
+    seed = config.get('seed')
     print(f'cosine annealing:\t{cosine_annealing}')
     print(f'random transforms:\t{random_transforms}')
     print(f'use class weights:\t{use_class_weights}')
@@ -55,74 +149,95 @@ def load_constants(config_name):
     print(f'epochs:\t\t\t\t{epochs}')
     print(f'batch size:\t\t\t{batch_size}')
     print(f'freeze_encoder:\t\t\t{freeze_encoder}')
-    return cosine_annealing, random_transforms, use_class_weights, epochs, batch_size, model_type, model_identifier, freeze_encoder
+    print(f'accum steps:\t\t\t{accum_steps}')
+    print(f'compile mode:\t\t\t{compile_mode}')
+    print(f'seed:\t\t\t\t{seed}')
+    return cosine_annealing, random_transforms, use_class_weights, epochs, batch_size, model_type, model_identifier, freeze_encoder, accum_steps, compile_mode, seed
 
 
 def get_model_optimizer_scheduler(cosine_annealing, random_transforms, use_class_weights, epochs, batch_size,
-                                  model_type, model_identifier, freeze_encoder):
-    n_class = 21
+                                  model_type, model_identifier, freeze_encoder, compile_mode='max-autotune', seed=None):
+    n_class = voc.num_classes
 
     mean_std = ([0.485, 0.456, 0.406], [0.229, 0.224, 0.225])
-    input_transform = standard_transforms.Compose([
-        standard_transforms.ToTensor(),
-        standard_transforms.Normalize(*mean_std),
-
-    ])
+    # images stay uint8 until they reach the device, NormalizeInput converts them there
+    input_transform = standard_transforms.PILToTensor()
     target_transform = MaskToTensor()
 
     train_dataset = voc.VOC('train', random_transforms, transform=input_transform, target_transform=target_transform)
     val_dataset = voc.VOC('val', False, transform=input_transform, target_transform=target_transform)
     test_dataset = voc.VOC('test', False, transform=input_transform, target_transform=target_transform)
 
-    train_loader = DataLoader(dataset=train_dataset, batch_size=batch_size, shuffle=True)
-    val_loader = DataLoader(dataset=val_dataset, batch_size=batch_size, shuffle=False)
-    test_loader = DataLoader(dataset=test_dataset, batch_size=batch_size, shuffle=False)
+    num_workers = min(8, os.cpu_count() or 0)
+    loader_kwargs = dict(batch_size=batch_size,
+                         pin_memory=torch.cuda.is_available(),  # page-locked batches allow async host to device copies
+                         num_workers=num_workers)
+    if num_workers > 0:
+        loader_kwargs.update(persistent_workers=True, prefetch_factor=4)
+    # the loader derives the shuffle order and each worker's python/torch seeds
+    # from this generator, so seeding it makes the random transforms reproducible
+    generator = torch.Generator().manual_seed(seed) if seed is not None else None
+    train_loader = DataLoader(dataset=train_dataset, shuffle=True, generator=generator, **loader_kwargs)
+    val_loader = DataLoader(dataset=val_dataset, shuffle=False, **loader_kwargs)
+    test_loader = DataLoader(dataset=test_dataset, shuffle=False, **loader_kwargs)
     if model_type.lower() == "unet":
         fcn_model = UNet(n_class=n_class)
-        fcn_model.apply(init_weights)
+        init_weights(fcn_model)
     elif model_type.lower() == "resnet":
         fcn_model = Resnet(n_class=n_class, freeze_encoder=freeze_encoder)
-        fcn_model.apply(init_weights_transfer_learning)
+        init_weights_transfer_learning(fcn_model)
     elif model_type.lower() == "new_arch":
         fcn_model = New_Arch(n_class=n_class)
-        fcn_model.apply(init_weights)
+        init_weights(fcn_model)
     elif model_type.lower() == "resnet50":
         fcn_model = Resnet50(n_class=n_class, freeze_encoder=freeze_encoder)
-        fcn_model.apply(init_weights_transfer_learning)
+        init_weights_transfer_learning(fcn_model)
     elif model_type.lower() == "resnet_leaky":
         fcn_model = ResnetLeaky(n_class=n_class, freeze_encoder=freeze_encoder)
-        fcn_model.apply(init_weights_transfer_learning)
+        init_weights_transfer_learning(fcn_model)
     elif model_type.lower() == "resnet_2model_skip_res_cat":
         fcn_model = Resnet2ModelSkipResCat(n_class=n_class, freeze_encoder=freeze_encoder)
-        fcn_model.apply(init_weights_transfer_learning)
+        init_weights_transfer_learning(fcn_model)
     elif model_type.lower() == "resnet_skip_residual":
         fcn_model = Resnet_Skip_Residual(n_class=n_class, freeze_encoder=freeze_encoder)
-        fcn_model.apply(init_weights_transfer_learning)
+        init_weights_transfer_learning(fcn_model)
     else:
         fcn_model = FCN(n_class=n_class)
-        fcn_model.apply(init_weights)
+        init_weights(fcn_model)
+
+    fcn_model = nn.Sequential(NormalizeInput(*mean_std), fcn_model)
 
     device = 'cuda' if torch.cuda.is_available() else 'cpu'  # TODO determine which device to use (cuda or cpu)
 
     device = torch.device(device)
 
-    optimizer = torch.optim.Adam(fcn_model.parameters(), lr=0.001)
+    # NHWC lets cudnn pick tensor core kernels without converting layouts on every conv
+    fcn_model = fcn_model.to(device=device, memory_format=torch.channels_last)  # TODO transfer the model to the device
+
+    # the fused kernel updates every parameter in one launch, but needs the
+    # parameters on cuda and a PyTorch that supports it
+    if device.type == 'cuda' and 'fused' in inspect.signature(torch.optim.Adam).parameters:
+        optimizer = torch.optim.Adam(fcn_model.parameters(), lr=0.001, fused=True)
+    else:
+        optimizer = torch.optim.Adam(fcn_model.parameters(), lr=0.001, foreach=device.type == 'cuda')
     if cosine_annealing:
         scheduler = CosineAnnealingWarmRestarts(optimizer, T_0=20, T_mult=1)
-    weights = train_dataset.get_class_weights()
     if use_class_weights:
-        class_weights = torch.FloatTensor(weights)
-        criterion = nn.CrossEntropyLoss(
-            weight=class_weights)
-        class_weights = class_weights.to(device)
+        weights = load_class_weights(train_dataset)
+        class_weights = torch.FloatTensor(weights).to(device)
+        criterion = nn.CrossEntropyLoss(weight=class_weights)
     else:
         criterion = nn.CrossEntropyLoss()
 
-    fcn_model = fcn_model.to(device=device)  # TODO transfer the model to the device
-    return fcn_model, optimizer, scheduler, criterion, train_loader, val_loader, test_loader, device, epochs, model_identifier, class_weights
+    # mixed precision is only worthwhile (and only supported by GradScaler) on cuda
+    scaler = GradScaler(enabled=device.type == 'cuda')
+    # torch.compile needs PyTorch 2.x, its cuda graphs only pay off on cuda
+    if compile_mode and device.type == 'cuda' and hasattr(torch, 'compile'):
+        fcn_model = torch.compile(fcn_model, mode=compile_mode, dynamic=False)
+    return fcn_model, optimizer, scheduler, criterion, train_loader, val_loader, test_loader, device, epochs, model_identifier, scaler
 
 
-def train(save_location, fcn_model, optimizer, scheduler, criterion, train_loader, val_loader, test_loader, device, epochs, model_identifier, class_weights):
+def train(save_location, fcn_model, optimizer, scheduler, criterion, train_loader, val_loader, test_loader, device, epochs, model_identifier, scaler, accum_steps=1):
     # ---------------------------------
     # Initialize network, progress bar,
     # arrays to record train/val accuracy
@@ -140,6 +255,8 @@ def train(save_location, fcn_model, optimizer, scheduler, criterion, train_loade
     # model performs worse
     bad_epochs = 0
     earlyStop = -1
+    save_executor = ThreadPoolExecutor(max_workers=1)
+    save_future = None
 
     # loading bar
     training_pbar = tqdm(total=epochs, desc=f'Training Procedure', position=0)
@@ -151,32 +268,36 @@ def train(save_location, fcn_model, optimizer, scheduler, criterion, train_loade
     for epoch in range(epochs):
         inner_pbar = tqdm(total=train_size, desc=f'Training Epoch {epoch + 1}', position=0, leave=True)
         iters = len(train_loader)
-        train_losses = []
-        for iter, (inputs, labels) in enumerate(train_loader):
-            optimizer.zero_grad()
-            if use_class_weights:
-                criterion = nn.CrossEntropyLoss(weight=class_weights)
-            else:
-                criterion = nn.CrossEntropyLoss()
-
-            inputs = inputs.to(device)
-            labels = labels.to(device)
-
-            outputs = fcn_model.forward(inputs)
-
-            loss = criterion(outputs, labels)
-            train_losses.append(loss.item())
-
-            loss.backward()
-            optimizer.step()
+        running_loss = torch.zeros((), device=device)  # summed on device, read back once per epoch
+        prefetcher = DataPrefetcher(train_loader, device)
+        inputs, labels = prefetcher.next()
+        iter = 0
+        optimizer.zero_grad(set_to_none=True)  # frees grads instead of writing zeros over them
+        while inputs is not None:
+            with autocast(enabled=scaler.is_enabled(), dtype=torch.float16):
+                outputs = fcn_model(inputs)
+                loss = criterion(outputs, labels)
+            running_loss += loss.detach()
+
+            # gradients of accum_steps batches are summed before each update, scale
+            # the loss by the size of the current group (the last one of an epoch
+            # may be shorter) so each update averages over the batches it contains
+            group_len = min(accum_steps, iters - (iter // accum_steps) * accum_steps)
+            scaler.scale(loss / group_len).backward()
+            if (iter + 1) % accum_steps == 0 or iter + 1 == iters:
+                scaler.step(optimizer)
+                scaler.update()
+                optimizer.zero_grad(set_to_none=True)
             if cosine_annealing:
                 scheduler.step(epoch + iter / iters)
 
             inner_pbar.update(train_loader.batch_size)
-        train_loss[epoch] = np.mean(train_losses)
+            inputs, labels = prefetcher.next()
+            iter += 1
+        train_loss[epoch] = (running_loss / max(iter, 1)).item()
         inner_pbar.close()
 
-        current_miou_score, current_accuracy, current_val_loss = val(epoch, fcn_model, criterion, val_loader, device, class_weights)
+        current_miou_score, current_accuracy, current_val_loss = val(epoch, fcn_model, criterion, val_loader, device)
         val_loss[epoch] = current_val_loss
         mean_iou_scores[epoch] = current_miou_score
         val_accuracy[epoch] = current_accuracy
@@ -184,8 +305,12 @@ def train(save_location, fcn_model, optimizer, scheduler, criterion, train_loade
         if current_miou_score > best_iou_score:
             best_iou_score = current_miou_score
             path = save_location + 'model.pt'
-            torch.save(fcn_model, path)
-            # save the best model
+            # save the best model: snapshot the weights to cpu and write them
+            # on a background thread so training does not wait on the disk
+            state_dict = {k: v.detach().to('cpu', copy=True) for k, v in unwrap_model(fcn_model).state_dict().items()}
+            if save_future is not None:
+                save_future.result()  # re-raise a failed previous save on the training thread
+            save_future = save_executor.submit(torch.save, {'state_dict': state_dict, 'epoch': epoch}, path)
 
         if epoch > 0 and early_stop and current_val_loss > val_loss[epoch - 1]:
             bad_epochs += 1
@@ -199,105 +324,117 @@ def train(save_location, fcn_model, optimizer, scheduler, criterion, train_loade
 
         training_pbar.update(1)
     training_pbar.close()
+    if save_future is not None:
+        save_future.result()
+    save_executor.shutdown(wait=True)
     util.plots(train_loss, val_loss, val_accuracy, mean_iou_scores, earlyStop, saveLocation=save_location)
 
 
-def val(epoch, fcn_model, criterion, val_loader, device, class_weights):
+def val(epoch, fcn_model, criterion, val_loader, device):
     fcn_model.eval()  # Put in eval mode (disables batchnorm/dropout) !
 
-    losses = []
-    mean_iou_scores = []
-    accuracy = []
+    running_loss = torch.zeros((), device=device)
+    n_batches = 0
+    confusion = torch.zeros((voc.num_classes, voc.num_classes), dtype=torch.long, device=device)
     with torch.no_grad():  # we don't need to calculate the gradient in the validation/testing
         val_size = len(val_loader.dataset)
         val_pbar = tqdm(total=val_size, desc=f'Validation Epoch {epoch + 1}', position=0, leave=True)
         for iter, (input, label) in enumerate(val_loader):
-            input = input.to(device)
-            output = fcn_model.forward(input)
-            label = label.to('cpu')
-            output = output.to('cpu')
-
-            if use_class_weights:
-                criterion = nn.CrossEntropyLoss(weight=class_weights.to('cpu'))
-            else:
-                criterion = nn.CrossEntropyLoss()
+            input = input.to(device, non_blocking=True, memory_format=torch.channels_last)
+            with autocast(enabled=device.type == 'cuda', dtype=torch.float16):
+                output = fcn_model(input)
+            output = output.float()
+            label = label.to(device, non_blocking=True)
+
             loss = criterion(output, label)
-            losses.append(loss.item())
+            running_loss += loss
+            n_batches += 1
 
             pred = output.argmax(dim=1)
-            mean_iou_scores.append(util.iou(pred, label))
-            accuracy.append(util.pixel_acc(pred, label))
+            confusion += util.confusion_matrix(pred, label, voc.num_classes)
             val_pbar.update(val_loader.batch_size)
         val_pbar.close()
     tqdm.write(f'Epoch\t{epoch + 1}')
-    tqdm.write(f"loss\t{np.mean(losses)}")
-    tqdm.write(f"IoU\t{np.mean(mean_iou_scores)}")
-    tqdm.write(f"PA\t{np.mean(accuracy)}")
+    mean_loss = (running_loss / max(n_batches, 1)).item()
+    confusion = confusion.cpu()
+    mean_iou_score = util.iou_from_confusion(confusion)
+    accuracy = util.pixel_acc_from_confusion(confusion)
+    tqdm.write(f"loss\t{mean_loss}")
+    tqdm.write(f"IoU\t{mean_iou_score}")
+    tqdm.write(f"PA\t{accuracy}")
 
     fcn_model.train()  # TURNING THE TRAIN MODE BACK ON TO ENABLE BATCHNORM/DROPOUT!!
 
-    return np.mean(mean_iou_scores), np.mean(accuracy), np.mean(losses)
+    return mean_iou_score, accuracy, mean_loss
 
 
-def modelTest(save_location, test_loader, device, criterion, class_weights):
+def modelTest(save_location, fcn_model, test_loader, device, criterion, plot=False):
     path = save_location + 'model.pt'
-    model = torch.load(path)
+    checkpoint = torch.load(path, map_location=device)
+    unwrap_model(fcn_model).load_state_dict(checkpoint['state_dict'])
+    model = fcn_model
     model.eval()
-    losses = []
-    mean_iou_scores = []
-    accuracy = []
-    # fcn_model.eval()  # Put in eval mode (disables batchnorm/dropout) !
+    running_loss = torch.zeros((), device=device)
+    n_batches = 0
+    confusion = torch.zeros((voc.num_classes, voc.num_classes), dtype=torch.long, device=device)
     i = 0
+    predictions = []
     with torch.no_grad():  # we don't need to calculate the gradient in the validation/testing
         test_size = len(test_loader.dataset)
         val_pbar = tqdm(total=test_size, desc=f'Testing', position=0, leave=True)
         for iter, (input, label) in enumerate(test_loader):
-            input = input.to(device)
-            output = model.forward(input)
-
-            output = output.to('cpu')
-            if use_class_weights:
-                criterion = nn.CrossEntropyLoss(weight=class_weights.to('cpu'))
-            else:
-                criterion = nn.CrossEntropyLoss()
+            input = input.to(device, non_blocking=True, memory_format=torch.channels_last)
+            with autocast(enabled=device.type == 'cuda', dtype=torch.float16):
+                output = model(input)
+            output = output.float()
+            label = label.to(device, non_blocking=True)
+
             loss = criterion(output, label)
-            losses.append(loss.item())
+            running_loss += loss
+            n_batches += 1
+
             pred = output.argmax(dim=1)
-            mean_iou_scores.append(util.iou(pred, label))
-            accuracy.append(util.pixel_acc(pred, label))
+            confusion += util.confusion_matrix(pred, label, voc.num_classes)
             val_pbar.update(test_loader.batch_size)
-            input = input.to('cpu')
-            util.plot_predictions(input[0], label[0], pred[0], save_location, i)
+            if plot:
+                # plotting is slow, only collect the samples here and render them after the loop
+                predictions.append((input[0].cpu(), label[0].cpu(), pred[0].cpu(), save_location, i))
             i = i + 1
         val_pbar.close()
-    tqdm.write(f"loss\t{np.mean(losses)}")
-    tqdm.write(f"IoU\t{np.mean(mean_iou_scores)}")
-    tqdm.write(f"PA\t{np.mean(accuracy)}")
+    for prediction in predictions:
+        util.plot_predictions(*prediction)
+    mean_loss = (running_loss / max(n_batches, 1)).item()
+    confusion = confusion.cpu()
+    mean_iou_score = util.iou_from_confusion(confusion)
+    accuracy = util.pixel_acc_from_confusion(confusion)
+    tqdm.write(f"loss\t{mean_loss}")
+    tqdm.write(f"IoU\t{mean_iou_score}")
+    tqdm.write(f"PA\t{accuracy}")
 
 
 # TURNING THE TRAIN MODE BACK ON TO ENABLE BATCHNORM/DROPOUT!!
 
 
 if __name__ == "__main__":
-    import os
-
     parser = argparse.ArgumentParser()
     parser.add_argument('--config', type=str, default='config5a-3.yml',
                         help='Specify the config that you want to run')
+    parser.add_argument('--plot', action='store_true',
+                        help='Save a prediction plot for the first image of every test batch')
     args = parser.parse_args()
-    cosine_annealing, random_transforms, use_class_weights, epochs, batch_size, model_type, model_identifier, freeze_encoder = load_constants(
+    cosine_annealing, random_transforms, use_class_weights, epochs, batch_size, model_type, model_identifier, freeze_encoder, accum_steps, compile_mode, seed = load_constants(
         args.config)
-    fcn_model, optimizer, scheduler, criterion, train_loader, val_loader, test_loader, device, epochs, model_identifier, class_weights=get_model_optimizer_scheduler(cosine_annealing, random_transforms, use_class_weights, epochs, batch_size, model_type, model_identifier, freeze_encoder)
+    fcn_model, optimizer, scheduler, criterion, train_loader, val_loader, test_loader, device, epochs, model_identifier, scaler = get_model_optimizer_scheduler(cosine_annealing, random_transforms, use_class_weights, epochs, batch_size, model_type, model_identifier, freeze_encoder, compile_mode, seed)
     path = 'Results'
     if not os.path.exists(path):
         os.mkdir(path)
     save_location = path + '/' + model_identifier
-    val(0, fcn_model, criterion, val_loader, device, class_weights)  # show the accuracy before training
+    val(0, fcn_model, criterion, val_loader, device)  # show the accuracy before training
     # timekeeping
     start = time.time()
 
-    train(save_location, fcn_model, optimizer, scheduler, criterion, train_loader, val_loader, test_loader, device, epochs, model_identifier, class_weights)
-    modelTest(save_location, test_loader, device, criterion, class_weights)
+    train(save_location, fcn_model, optimizer, scheduler, criterion, train_loader, val_loader, test_loader, device, epochs, model_identifier, scaler, accum_steps)
+    modelTest(save_location, fcn_model, test_loader, device, criterion, plot=args.plot)
 
     end = time.time()
 
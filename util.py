@@ -1,64 +1,61 @@
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
+import torch
 
 
-def iou(pred, target, n_classes: int = 21) -> float:
+def confusion_matrix(pred, target, n_classes: int):
     """
-    Compute the Intersection-over-Union (IoU) of a single pattern, where
-    for some object class k:
+    Compute the confusion matrix of a batch of patterns on whatever device
+    pred and target live on, so it can be accumulated over an epoch and only
+    copied back once. Entry [i, j] counts the pixels of class i predicted as j.
 
-    pixels(pattern, k) = set of pixels in the given pattern labeled class k
+    :param pred: tensor containing the pixel predictions of the model
+    :param target: tensor containing the class labels of the input
+    :param n_classes: The expected number of classes in the pattern
+    :return: A (n_classes, n_classes) int64 tensor on the device of pred
+    """
+    # target entries with value 255 denote object boundaries, count them as
+    # background (pred comes from argmax and is always a valid class)
+    target = target.masked_fill(target == 255, 0)
+    # encode every (target, pred) pair as one bin index and count them in one pass;
+    # unlike torch.bincount, index_add_ on a fixed size output needs no host sync
+    bins = n_classes * target.reshape(-1) + pred.reshape(-1)
+    counts = torch.zeros(n_classes ** 2, dtype=torch.long, device=bins.device)
+    return counts.index_add_(0, bins, torch.ones_like(bins)).reshape(n_classes, n_classes)
+
+
+def iou_from_confusion(confusion) -> float:
+    """
+    Compute the mean Intersection-over-Union (IoU) from an accumulated
+    confusion matrix, where for some object class k:
+
+    pixels(k) = set of pixels labeled class k
 
     IoU of k = intersect(pixels(pred, k), pixels(target, k)) / union(pixels(pred, k), pixels(target, k))
 
     After computing the IoU for each class, we simply average over each class to
-    obtain a general IoU for the entire pattern.
+    obtain a general IoU.
 
-    :param pred: array containing the pixel predictions of the model
-    :param target: array containing the class labels of the input
-    :param n_classes: The expected number of classes in the pattern
-    :return: The IoU of the pattern as a float
+    :param confusion: confusion matrix as returned by confusion_matrix()
+    :return: The mean IoU as a float
     """
-    # pre-process pred and target, some entries will have value 255,
-    # denoting object boundaries. set to 0, denoting background class
-    pred[pred == 255] = 0
-    target[target == 255] = 0
-    # init empty array to hold IoU for each class
-    iou = np.zeros(n_classes)
-    # iterate through each class
-    for k in range(n_classes):
-        # calc the union of the pixels in pred and target labeled class k
-        union = np.count_nonzero(np.logical_or(pred == k, target == k))
-        union = union + 1e-10
-        # calc the intersection of the pixels in pred and target labeled class k
-        intersect = np.count_nonzero(np.logical_and(pred == k, target == k))
-        # calc the IoU for class k
-        iou[k] = intersect / union
-    # return the mean IoU of the pattern
-    return np.average(iou)
-
-
-def pixel_acc(pred, target) -> float:
+    confusion = confusion.double()
+    intersect = torch.diag(confusion)
+    union = confusion.sum(dim=0) + confusion.sum(dim=1) - intersect + 1e-10
+    return (intersect / union).mean().item()
+
+
+def pixel_acc_from_confusion(confusion) -> float:
     """
-    Compute the pixel accuracy (PA) of a single pattern, where:
+    Compute the pixel accuracy (PA) from an accumulated confusion matrix, where:
 
     PA = # pixels w/ correct predictions / # of pixels
 
-    :param pred: array containing the pixel predictions of the model
-    :param target: array containing the class labels of the input
+    :param confusion: confusion matrix as returned by confusion_matrix()
     :return: A float, denoting PA according to calculation above
     """
-    # pre-process pred and target, some entries will have value 255,
-    # denoting object boundaries. set to 0, denoting background class
-    pred[pred == 255] = 0
-    target[target == 255] = 0
-    # calc the number of pixels in the pattern
-    n_pixels = np.prod(pred.shape)
-    # calc the number of pixels with correct predictions
-    correct_pixels = np.count_nonzero(pred == target)
-    # calc and return the pixel accuracy
-    return correct_pixels / n_pixels
+    return (torch.trace(confusion).double() / confusion.sum()).item()
 
 
 def plots(trainEpochLoss, valEpochLoss, valEpochAccuracy, valIoU, earlyStop, type="", saveLocation="test_"):
@@ -103,3 +100,4 @@ def plot_predictions(image, mask, pred, save_location, i):
     ax[2].imshow(pred)
     ax[2].set_title("Prediction")
     plt.savefig(save_location + "predictions" + str(i) + ".png")
+    plt.close(fig)